@@ -16,14 +16,28 @@ Author: Created for local, privacy-focused transaction analysis
 
 import streamlit as st
 import pandas as pd
+from pandas.api.types import union_categoricals
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import numpy as np
 import io
+import os
+import csv
+import codecs
+import shutil
 import json
 import re
+import asyncio
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
 import tempfile
+import threading
 import ollama
 import plotly.graph_objects as go
 
@@ -41,6 +55,14 @@ try:
 except ImportError:
     OCR_AVAILABLE = False
 
+# Fast CSV parsing
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 
 # ============================================================================
 # CONFIGURATION & CONSTANTS
@@ -89,10 +111,83 @@ Deine Aufgabe ist es, die Transaktion einer der folgenden Kategorien zuzuordnen:
 - Rundfunkbeitrag ist bei Wohnen dabei
 - Handyvertrag gehört zu Freizeit & Lifestyle
 
-Wenn du dir nicht sicher bist, antworte mit 'Sonstiges'. Antworte nur mit der Kategorie, keine Begründung!"""
+Wenn du dir nicht sicher bist, antworte mit 'unsicher'. Antworte nur mit der Kategorie, keine Begründung!"""
 
 CONFIG_FILE = "config.json"
 
+# Expense rules applied before asking Ollama, configured in config.json under
+# "keyword_rules". Keys are regular expressions matched case-insensitively against
+# account and description, the first matching rule wins. Empty by default, so the
+# rules in the (editable) system prompt stay the only source of truth.
+KEYWORD_RULES: Dict[str, str] = {}
+
+# Model per speed/accuracy trade-off. Smaller models and quantizations classify
+# much faster on CPU-only machines; override in config.json under "models".
+MODEL_PROFILES = {
+    'fast': 'qwen2.5:1.5b-instruct-q4_K_M',
+    'balanced': 'qwen3:4b-instruct-2507-q4_K_M',
+    'accurate': 'qwen3:4b-instruct-2507-q8_0',
+}
+
+# Persistent (Account, Description) -> Category cache, see classification_cache_key
+CLASSIFICATION_CACHE_FILE = "classify_cache.db"
+
+# Keys per cache lookup query, below SQLite's limit of bound parameters
+CACHE_LOOKUP_CHUNK = 500
+
+# Number of classification requests kept in flight at once. Match this to the
+# OLLAMA_NUM_PARALLEL setting of the Ollama server.
+try:
+    OLLAMA_NUM_PARALLEL = int(os.getenv('OLLAMA_NUM_PARALLEL', '4'))
+except ValueError:
+    OLLAMA_NUM_PARALLEL = 0
+if OLLAMA_NUM_PARALLEL < 1:
+    st.warning(f"Invalid OLLAMA_NUM_PARALLEL value {os.getenv('OLLAMA_NUM_PARALLEL')!r}, using 4")
+    OLLAMA_NUM_PARALLEL = 4
+
+# Batch sizes tried by the batch size auto-tuner, see classify_transactions
+BATCH_SIZE_CANDIDATES = [8, 16, 32, 64]
+
+# Extra answer allowed when a fallback model re-checks uncertain transactions
+UNSURE_ANSWER = 'unsicher'
+
+# Upper bound of generated tokens per classified transaction (caps num_predict)
+MAX_TOKENS_PER_CATEGORY = 16
+
+# How long Ollama keeps the model (and the cached system prompt) loaded between requests
+OLLAMA_KEEP_ALIVE = '30m'
+
+# Shared client so all synchronous requests reuse one HTTP connection pool
+OLLAMA_CLIENT = ollama.Client()
+
+# Encoding and delimiter of CSV uploads are detected from this many leading bytes
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+# Number prefix of a line in a numbered-list model response ("1. ", "2) ", "3 - ")
+_NUM_PREFIX_RE = re.compile(r'^\d+[\.\)\-\:]?\s*')
+
+# Amount cleaning: currency symbols, and everything that can't be part of a number
+_CURRENCY_RE = re.compile(r'[€$£¥]')
+_NONNUM_RE = re.compile(r'[^\d.\-]')
+_DIGITS_RE = re.compile(r'\d+')
+
+# PDF rows that contain a date or an amount are treated as transaction data
+_TRANSACTION_DATA_RE = re.compile(r'\d{1,2}[./]\d{1,2}[./]\d{2,4}|-?\d+[.,]\d{2}')
+
+# pdfplumber table detection: use the ruling lines of statement tables
+PDF_TABLE_SETTINGS = {
+    'vertical_strategy': 'lines',
+    'horizontal_strategy': 'lines',
+    'intersection_tolerance': 5,
+}
+
+# PDFs with more selectable text than this on their first 2 pages are not scanned
+PDF_TEXT_PROBE_CHARS = 200
+
+# Descriptions of investment transactions, which are never internal transfers
+INVESTMENT_KEYWORDS = ['WP-', 'Wertpapier', 'ETF', 'ISIN', 'Kauf', 'Verkauf', 'Dividende', 'Zins']
+_INVEST_RE = re.compile('|'.join(re.escape(k) for k in INVESTMENT_KEYWORDS), re.IGNORECASE)
+
 # Common column name variations for auto-detection
 COLUMN_MAPPINGS = {
     'date': ['datum', 'date', 'buchung', 'valuta', 'buchungstag', 'wertstellung', 'transaction date', 'transactiondate'],
@@ -102,11 +197,51 @@ COLUMN_MAPPINGS = {
     'currency': ['währung', 'waehrung', 'whrung', 'currency', 'whrun', 'eur', 'usd']
 }
 
+# Supported date formats, tried in order
+DATE_FORMATS = [
+    '%d.%m.%Y',
+    '%Y-%m-%d',
+    '%d/%m/%Y',
+    '%m/%d/%Y',
+    '%d.%m.%y',
+    '%Y%m%d',
+]
+
+# Mojibake patterns and their correct German characters
+CORRUPTION_FIXES = {
+    # UTF-8 mojibake (double-encoding issues)
+    'Ã¼': 'ü',
+    'Ã¶': 'ö',
+    'Ã¤': 'ä',
+    'ÃŸ': 'ß',
+    'Ãœ': 'Ü',
+    'Ã–': 'Ö',
+    'Ã„': 'Ä',
+    'Â°': '°',
+    'Â€': '€',
+    # Replacement character patterns
+    '\ufffd': 'ä',  # Unicode replacement character
+    '�': 'ä',  # Replacement character (often for ä in "Empfänger")
+    'Empf�nger': 'Empfänger',
+    'W�hrung': 'Währung',
+    'Auftraggeber/Empf�nger': 'Auftraggeber/Empfänger',
+}
+
+# Characters that start every CORRUPTION_FIXES pattern; text without them needs no fixing
+CORRUPTION_MARKERS = ('Ã', 'Â', '\ufffd')
+
+# Single characters are fixed with str.translate, longer patterns with one regex
+_CORRUPTION_CHAR_MAP = str.maketrans({k: v for k, v in CORRUPTION_FIXES.items() if len(k) == 1})
+_CORRUPTION_RE = re.compile('|'.join(
+    re.escape(k) for k in sorted((k for k in CORRUPTION_FIXES if len(k) > 1), key=len, reverse=True)
+))
+
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+@st.cache_data(ttl=5)
 def load_config() -> Dict:
     """Load configuration from file or return default."""
     if Path(CONFIG_FILE).exists():
@@ -119,7 +254,9 @@ def load_config() -> Dict:
         'user_name': '',
         'bank_profiles': {},
         'custom_categories': DEFAULT_CATEGORIES.copy(),
-        'system_prompt': SYSTEM_PROMPT
+        'system_prompt': SYSTEM_PROMPT,
+        'models': MODEL_PROFILES.copy(),
+        'keyword_rules': KEYWORD_RULES.copy()
     }
 
 
@@ -128,6 +265,7 @@ def save_config(config: Dict):
     try:
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=2, ensure_ascii=False)
+        load_config.clear()
     except Exception as e:
         st.error(f"Could not save config: {e}")
 
@@ -141,7 +279,7 @@ def check_ollama_available() -> Tuple[bool, str]:
     """
     try:
         # Try to list models - this will fail if Ollama is not installed or not running
-        ollama.list()
+        OLLAMA_CLIENT.list()
         return True, ""
     except Exception as e:
         error_str = str(e).lower()
@@ -151,10 +289,11 @@ def check_ollama_available() -> Tuple[bool, str]:
             return False, "not_installed"
 
 
+@st.cache_data(ttl=30)
 def get_available_ollama_models() -> List[str]:
     """Get list of models currently available in Ollama."""
     try:
-        response = ollama.list()
+        response = OLLAMA_CLIENT.list()
         # Handle both dict and object response formats
         if hasattr(response, 'models'):
             models = response.models
@@ -182,15 +321,21 @@ def get_available_ollama_models() -> List[str]:
         return []
 
 
-def format_model_option(model_name: str, available_models: List[str]) -> str:
-    """Format model name with availability indicator."""
-    # Check if any available model starts with the model_name (handles tags)
-    is_available = any(available.startswith(model_name.split(':')[0]) for available in available_models)
+def is_model_downloaded(model_name: str, available_models: List[str]) -> bool:
+    """Check if exactly this model tag is downloaded."""
+    # Match the exact tag - different quantizations of one model are separate downloads
+    return model_name in available_models or f"{model_name}:latest" in available_models
+
+
+def format_model_option(model_name: str, available_models: List[str], profile: Optional[str] = None) -> str:
+    """Format model name with profile label and availability indicator."""
+    is_available = is_model_downloaded(model_name, available_models)
+    label = f"{model_name} ({profile})" if profile else model_name
     
     if is_available:
-        return f"{model_name} ✓"
+        return f"{label} ✓"
     else:
-        return f"{model_name} (not downloaded)"
+        return f"{label} (not downloaded)"
 
 
 def detect_encoding(file_bytes: bytes) -> str:
@@ -222,36 +367,33 @@ def detect_delimiter(file_content: str) -> str:
     return detected if delimiter_counts[detected] > 0 else ';'
 
 
+@lru_cache(maxsize=1024)
 def normalize_column_name(col: str) -> str:
     """Normalize column name for comparison."""
     return col.lower().strip().replace(' ', '').replace('_', '')
 
 
+# Normalized column name variation -> (field, priority), earlier variations win
+_VAR_TO_FIELD = {}
+for _field, _variations in COLUMN_MAPPINGS.items():
+    for _rank, _variation in enumerate(_variations):
+        _VAR_TO_FIELD.setdefault(normalize_column_name(_variation), (_field, _rank))
+
+
 def auto_detect_columns(df: pd.DataFrame) -> Dict[str, Optional[str]]:
     """Automatically detect standard columns in DataFrame."""
-    detected = {
-        'date': None,
-        'description': None,
-        'amount': None,
-        'account': None,
-        'currency': None
-    }
+    detected = dict.fromkeys(COLUMN_MAPPINGS)
+    best_rank = {}
     
-    # Create mapping of normalized column names to original names
-    # Handle duplicate column names by only using the first occurrence
-    normalized_cols = {}
+    # Single pass over the columns; for duplicate names the first occurrence wins
     for col in df.columns:
-        norm = normalize_column_name(col)
-        if norm not in normalized_cols:  # Only keep first occurrence
-            normalized_cols[norm] = col
-    
-    # Try to match each field
-    for field, variations in COLUMN_MAPPINGS.items():
-        for variation in variations:
-            norm_var = normalize_column_name(variation)
-            if norm_var in normalized_cols:
-                detected[field] = normalized_cols[norm_var]
-                break
+        match = _VAR_TO_FIELD.get(normalize_column_name(col))
+        if match is None:
+            continue
+        field, rank = match
+        if rank < best_rank.get(field, len(COLUMN_MAPPINGS[field])):
+            detected[field] = col
+            best_rank[field] = rank
     
     return detected
 
@@ -261,18 +403,9 @@ def parse_date(date_str: str) -> Optional[datetime]:
     if pd.isna(date_str):
         return None
     
-    date_formats = [
-        '%d.%m.%Y',
-        '%Y-%m-%d',
-        '%d/%m/%Y',
-        '%m/%d/%Y',
-        '%d.%m.%y',
-        '%Y%m%d',
-    ]
-    
     date_str = str(date_str).strip()
     
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(date_str, fmt)
         except ValueError:
@@ -281,6 +414,28 @@ def parse_date(date_str: str) -> Optional[datetime]:
     return None
 
 
+def parse_date_series(dates: pd.Series) -> pd.Series:
+    """Vectorized version of parse_date for a whole column."""
+    s = dates.astype('string').str.strip()
+    result = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns]')
+    
+    # Earlier formats take precedence, as in parse_date
+    for fmt in DATE_FORMATS:
+        missing = result.isna() & s.notna()
+        if not missing.any():
+            break
+        parsed = pd.to_datetime(s[missing], format=fmt, errors='coerce')
+        result = result.combine_first(parsed)
+    
+    # Last resort: let pandas guess the remaining (day-first) formats
+    missing = result.isna() & s.notna()
+    if missing.any():
+        parsed = pd.to_datetime(s[missing], format='mixed', dayfirst=True, errors='coerce')
+        result = result.combine_first(parsed)
+    
+    return result
+
+
 def clean_amount(amount_str: str) -> float:
     """Clean and parse amount string to float."""
     if pd.isna(amount_str):
@@ -290,7 +445,7 @@ def clean_amount(amount_str: str) -> float:
     amount_str = str(amount_str).strip()
     
     # Remove currency symbols
-    amount_str = re.sub(r'[€$£¥]', '', amount_str)
+    amount_str = _CURRENCY_RE.sub('', amount_str)
     
     # Handle European format (1.234,56)
     if ',' in amount_str and '.' in amount_str:
@@ -301,7 +456,7 @@ def clean_amount(amount_str: str) -> float:
         amount_str = amount_str.replace(',', '.')
     
     # Remove any remaining non-numeric except . and -
-    amount_str = re.sub(r'[^\d.-]', '', amount_str)
+    amount_str = _NONNUM_RE.sub('', amount_str)
     
     try:
         return float(amount_str)
@@ -309,21 +464,40 @@ def clean_amount(amount_str: str) -> float:
         return 0.0
 
 
+def clean_amount_series(amounts: pd.Series) -> pd.Series:
+    """Vectorized version of clean_amount for a whole column."""
+    s = amounts.astype('string').str.strip()
+
+    # Remove currency symbols
+    s = s.str.replace(_CURRENCY_RE, '', regex=True)
+
+    # Handle European format (1.234,56): drop thousands separators first
+    has_both = s.str.contains('.', regex=False) & s.str.contains(',', regex=False)
+    s = s.where(~has_both.fillna(False), s.str.replace('.', '', regex=False))
+
+    # Remaining commas are decimal separators
+    s = s.str.replace(',', '.', regex=False)
+
+    # Remove any remaining non-numeric except . and -
+    s = s.str.replace(_NONNUM_RE, '', regex=True)
+
+    return pd.to_numeric(s, errors='coerce').fillna(0.0).astype('float64')
+
+
 # ============================================================================
 # PDF PROCESSING
 # ============================================================================
 
-def extract_table_from_pdf_pdfplumber(pdf_file) -> pd.DataFrame:
-    """Extract tables from PDF using pdfplumber."""
+def extract_table_from_pdf_pdfplumber(pdf) -> pd.DataFrame:
+    """Extract tables from a PDF opened with pdfplumber."""
     all_tables = []
     
-    with pdfplumber.open(pdf_file) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                if table:
-                    df = pd.DataFrame(table[1:], columns=table[0])
-                    all_tables.append(df)
+    for page in pdf.pages:
+        tables = page.extract_tables(table_settings=PDF_TABLE_SETTINGS)
+        for table in tables:
+            if table:
+                df = pd.DataFrame(table[1:], columns=table[0])
+                all_tables.append(df)
     
     if all_tables:
         return pd.concat(all_tables, ignore_index=True)
@@ -338,7 +512,7 @@ def extract_table_from_pdf_pymupdf(pdf_file) -> pd.DataFrame:
         # Save to temp file if needed
         if hasattr(pdf_file, 'read'):
             with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                tmp.write(pdf_file.read())
+                shutil.copyfileobj(pdf_file, tmp)
                 tmp_path = tmp.name
                 pdf_file.seek(0)  # Reset for other methods
         else:
@@ -420,12 +594,9 @@ def extract_table_from_pdf_pymupdf(pdf_file) -> pd.DataFrame:
             # Skip rows that are likely headers (all caps, short text, etc.)
             if len(df) > 5:
                 # Try to identify data rows (rows with dates or amounts)
-                date_pattern = r'\d{1,2}[./]\d{1,2}[./]\d{2,4}'
-                amount_pattern = r'-?\d+[.,]\d{2}'
-                
                 def has_transaction_data(row):
                     row_str = ' '.join(str(x) for x in row if pd.notna(x))
-                    return bool(re.search(date_pattern, row_str) or re.search(amount_pattern, row_str))
+                    return bool(_TRANSACTION_DATA_RE.search(row_str))
                 
                 data_mask = df.apply(has_transaction_data, axis=1)
                 if data_mask.any():
@@ -446,6 +617,17 @@ def extract_table_from_pdf_pymupdf(pdf_file) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+@st.cache_resource
+def _ocr_executor() -> ThreadPoolExecutor:
+    """One pool for all Tesseract runs, so files parsed in parallel share the CPU cores."""
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+def _ocr_one_image(image) -> str:
+    """Run Tesseract on a single page image."""
+    return pytesseract.image_to_string(image, lang='deu+eng')
+
+
 def extract_text_with_ocr(pdf_file) -> str:
     """Extract text from scanned PDF using OCR."""
     if not OCR_AVAILABLE:
@@ -453,16 +635,17 @@ def extract_text_with_ocr(pdf_file) -> str:
     
     # Save uploaded file temporarily
     with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-        tmp.write(pdf_file.read())
+        shutil.copyfileobj(pdf_file, tmp)
         tmp_path = tmp.name
     
     text = ""
     try:
         from pdf2image import convert_from_path
-        images = convert_from_path(tmp_path)
+        images = convert_from_path(tmp_path, thread_count=1)
         
-        for image in images:
-            text += pytesseract.image_to_string(image, lang='deu+eng')
+        # pytesseract runs the tesseract binary in a subprocess, so threads
+        # are enough to OCR several pages in parallel
+        text = "\n".join(_ocr_executor().map(_ocr_one_image, images))
     except Exception as e:
         st.warning(f"OCR failed: {e}")
     finally:
@@ -485,9 +668,15 @@ def pdf_to_dataframe(pdf_file, filename: str) -> Tuple[pd.DataFrame, str]:
         st.info("💡 **Tip**: Most banks let you download CSV files directly. CSVs work much better and are easier to process!")
         return df, method
     
-    # Try pdfplumber first (best for structured tables)
+    # Try pdfplumber first (best for structured tables), opening the PDF only
+    # once for both the text probe and the table extraction
+    has_text = False
     try:
-        df = extract_table_from_pdf_pdfplumber(pdf_file)
+        with pdfplumber.open(pdf_file) as pdf:
+            # Selectable text means the PDF isn't scanned, so OCR can't do better
+            probe_chars = sum(len(page.extract_text() or '') for page in pdf.pages[:2])
+            has_text = probe_chars > PDF_TEXT_PROBE_CHARS
+            df = extract_table_from_pdf_pdfplumber(pdf)
         if not df.empty:
             method = "pdfplumber"
             return df, method
@@ -506,7 +695,7 @@ def pdf_to_dataframe(pdf_file, filename: str) -> Tuple[pd.DataFrame, str]:
         pass
     
     # Try OCR as final fallback (for scanned PDFs)
-    if OCR_AVAILABLE:
+    if OCR_AVAILABLE and not has_text:
         try:
             pdf_file.seek(0)
             text = extract_text_with_ocr(pdf_file)
@@ -546,16 +735,22 @@ def pdf_to_dataframe(pdf_file, filename: str) -> Tuple[pd.DataFrame, str]:
 # ============================================================================
 
 def load_csv_file(file) -> pd.DataFrame:
-    """Load CSV file with automatic encoding and delimiter detection."""
-    # Read file bytes
-    file_bytes = file.read()
+    """
+    Load CSV file with automatic encoding and delimiter detection.
+    
+    Encoding and delimiter are detected from the first ENCODING_SAMPLE_BYTES
+    only; the parser then reads the file object itself instead of a decoded
+    in-memory copy.
+    """
+    # Read only the start of the file for detection
+    sample = file.read(ENCODING_SAMPLE_BYTES)
+    file.seek(0)
+    is_complete = len(sample) < ENCODING_SAMPLE_BYTES
     
     # Try UTF-8 first, then fallback to cp1252/ISO-8859-1
-    # If file has UTF-8 BOM, use it
-    if file_bytes.startswith(b'\xef\xbb\xbf'):
-        file_bytes = file_bytes[3:]  # Remove BOM
-        file_content = file_bytes.decode('utf-8')
-        successful_encoding = 'utf-8-sig'
+    # If file has UTF-8 BOM, use it (utf-8-sig strips it)
+    if sample.startswith(b'\xef\xbb\xbf'):
+        encodings_to_try = [('utf-8-sig', 'strict')]
     else:
         # For German CSV files from Excel/Windows, try these in order
         encodings_to_try = [
@@ -565,67 +760,60 @@ def load_csv_file(file) -> pd.DataFrame:
             ('ISO-8859-15', 'strict'),  # Latin-9 with €
             ('cp1252', 'replace'),  # Fallback with replacement
         ]
-        
-        file_content = None
-        successful_encoding = None
-        
-        for encoding, error_mode in encodings_to_try:
-            try:
-                decoded = file_bytes.decode(encoding, errors=error_mode)
-                file_content = decoded
-                successful_encoding = encoding
-                break
-            except (UnicodeDecodeError, LookupError):
-                continue
-        
-        # Ultimate fallback
-        if file_content is None:
-            file_content = file_bytes.decode('cp1252', errors='ignore')
-            successful_encoding = 'cp1252 (fallback)'
     
-    # Detect delimiter
-    delimiter = detect_delimiter(file_content)
+    sample_text = None
+    successful_encoding = None
+    encoding_errors = 'strict'
     
-    # Parse CSV
-    df = pd.read_csv(
-        io.StringIO(file_content),
-        delimiter=delimiter,
-        on_bad_lines='skip'
-    )
+    for encoding, error_mode in encodings_to_try:
+        try:
+            # Incremental decoder: a multi-byte character cut off at the end
+            # of the sample is not an error
+            decoder = codecs.getincrementaldecoder(encoding)(errors=error_mode)
+            sample_text = decoder.decode(sample, final=is_complete)
+            successful_encoding = encoding
+            encoding_errors = error_mode
+            break
+        except (UnicodeDecodeError, LookupError):
+            continue
     
-    # Fix common encoding corruption in column names and data
-    # Replace mojibake patterns with correct German characters
-    corruption_fixes = {
-        # UTF-8 mojibake (double-encoding issues)
-        'Ã¼': 'ü',
-        'Ã¶': 'ö',
-        'Ã¤': 'ä',
-        'ÃŸ': 'ß',
-        'Ãœ': 'Ü',
-        'Ã–': 'Ö',
-        'Ã„': 'Ä',
-        'Â°': '°',
-        'Â€': '€',
-        # Replacement character patterns
-        '\ufffd': 'ä',  # Unicode replacement character
-        '�': 'ä',  # Replacement character (often for ä in "Empfänger")
-        'Empf�nger': 'Empfänger',
-        'W�hrung': 'Währung',
-        'Auftraggeber/Empf�nger': 'Auftraggeber/Empfänger',
-    }
+    # Ultimate fallback
+    if sample_text is None:
+        sample_text = sample.decode('cp1252', errors='ignore')
+        successful_encoding = 'cp1252'
+        encoding_errors = 'ignore'
     
-    # Fix column names first
-    new_columns = []
-    for col in df.columns:
-        fixed_col = str(col)
-        for corrupted, correct in corruption_fixes.items():
-            fixed_col = fixed_col.replace(corrupted, correct)
-        new_columns.append(fixed_col)
-    df.columns = new_columns
+    # Detect delimiter
+    delimiter = detect_delimiter(sample_text)
+    
+    # Keep date and amount as raw text, normalize_dataframe parses them
+    header_line = sample_text.split('\n', 1)[0].rstrip('\r')
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    detected = auto_detect_columns(pd.DataFrame(columns=header))
+    text_columns = {detected[field]: str for field in ('date', 'amount') if detected[field]}
     
-    # Fix string columns
-    for col in df.select_dtypes(include=['object']).columns:
-        df[col] = df[col].apply(lambda x: apply_corruption_fixes(str(x), corruption_fixes) if pd.notna(x) else x)
+    # Parse CSV straight from the file object
+    try:
+        df = read_csv_data(file, delimiter, successful_encoding, dtype=text_columns, encoding_errors=encoding_errors)
+    except UnicodeDecodeError:
+        # Bytes after the sample don't fit the detected encoding
+        file.seek(0)
+        successful_encoding, encoding_errors = 'cp1252', 'replace'
+        df = read_csv_data(file, delimiter, successful_encoding, dtype=text_columns, encoding_errors=encoding_errors)
+    
+    if encoding_errors != 'strict':
+        successful_encoding = f'{successful_encoding} (fallback)'
+    
+    # Fix common encoding corruption in column names and data (see CORRUPTION_FIXES),
+    # unless the file decoded cleanly and the sample shows no sign of it
+    needs_fix = encoding_errors != 'strict' or any(marker in sample_text for marker in CORRUPTION_MARKERS)
+    if needs_fix:
+        # Fix column names first
+        df.columns = fix_corrupted_text(df.columns.to_series().astype(str)).tolist()
+        
+        # Fix string columns
+        object_cols = df.select_dtypes(include=['object']).columns
+        df[object_cols] = df[object_cols].apply(fix_corrupted_text)
     
     # Store encoding info as metadata
     if hasattr(df, 'attrs'):
@@ -635,11 +823,82 @@ def load_csv_file(file) -> pd.DataFrame:
     return df
 
 
-def apply_corruption_fixes(text: str, fixes: Dict[str, str]) -> str:
-    """Apply corruption fixes to text."""
-    for corrupted, correct in fixes.items():
-        text = text.replace(corrupted, correct)
-    return text
+def read_csv_data(
+    source,
+    delimiter: str,
+    encoding: Optional[str] = None,
+    dtype: Optional[Dict] = None,
+    encoding_errors: str = 'strict'
+) -> pd.DataFrame:
+    """
+    Parse CSV data with the multi-threaded pyarrow reader.
+    
+    Columns listed in dtype are read as text, so dates and German amounts
+    like '1.500' keep their original form. Files pyarrow can't read as-is
+    (ragged rows, undecodable text, no pyarrow installed) go through pandas'
+    C engine, which pads short rows and skips overlong ones. Column names are
+    made unique the same way the C engine does it, so duplicate or blank
+    headers can still be selected.
+    """
+    read_options = {
+        'sep': delimiter,
+        'encoding': encoding,
+        'encoding_errors': encoding_errors,
+        'dtype': dtype,
+        'on_bad_lines': 'skip'
+    }
+    
+    if not PYARROW_AVAILABLE or encoding_errors != 'strict':
+        return pd.read_csv(source, **read_options)
+    
+    try:
+        table = pa_csv.read_csv(
+            source,
+            read_options=pa_csv.ReadOptions(encoding=encoding or 'utf8'),
+            parse_options=pa_csv.ParseOptions(delimiter=delimiter),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={col: pa.string() for col in dtype or {}},
+                strings_can_be_null=True
+            )
+        )
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        source.seek(0)
+        return pd.read_csv(source, **read_options)
+    
+    # pyarrow returns text that isn't valid UTF-8 as a binary column instead
+    # of failing - let the C engine handle (or reject) such files
+    if any(pa.types.is_binary(field.type) for field in table.schema):
+        source.seek(0)
+        return pd.read_csv(source, **read_options)
+    
+    df = table.to_pandas()
+    df.columns = make_unique_columns(df.columns)
+    return df
+
+
+def make_unique_columns(columns) -> List[str]:
+    """Name blank columns 'Unnamed: i' and number duplicates 'name.1', 'name.2', ..."""
+    counts = {}
+    unique = []
+    for i, col in enumerate(columns):
+        name = str(col) if str(col).strip() else f'Unnamed: {i}'
+        if name in counts:
+            counts[name] += 1
+            name = f'{name}.{counts[name]}'
+        else:
+            counts[name] = 0
+        unique.append(name)
+    return unique
+
+
+def fix_corrupted_text(series: pd.Series) -> pd.Series:
+    """Apply CORRUPTION_FIXES to every non-null value of a Series."""
+    fixed = (
+        series.astype(str)
+        .str.replace(_CORRUPTION_RE, lambda m: CORRUPTION_FIXES[m.group(0)], regex=True)
+        .str.translate(_CORRUPTION_CHAR_MAP)
+    )
+    return fixed.where(series.notna(), series)
 
 
 def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str], source_file: str) -> pd.DataFrame:
@@ -658,9 +917,10 @@ def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str], source
     
     # Map date
     if column_mapping.get('date'):
-        normalized['Date'] = df[column_mapping['date']].apply(parse_date)
+        normalized['Date'] = parse_date_series(df[column_mapping['date']])
     else:
-        normalized['Date'] = None
+        # Keep the column datetime64 so merged data never falls back to object
+        normalized['Date'] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
     
     # Map description
     if column_mapping.get('description'):
@@ -670,7 +930,7 @@ def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str], source
     
     # Map amount
     if column_mapping.get('amount'):
-        normalized['Amount'] = df[column_mapping['amount']].apply(clean_amount)
+        normalized['Amount'] = clean_amount_series(df[column_mapping['amount']])
     else:
         normalized['Amount'] = 0.0
     
@@ -692,7 +952,16 @@ def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str], source
     # Initialize other fields
     normalized['Category'] = 'Uncategorized'
     normalized['Internal_Transfer'] = False
-    
+
+    # Compact dtypes for the repetitive columns. Category stays object because
+    # classification writes new labels into it; Amount stays float64 so cents
+    # are exact enough for sums and transfer matching.
+    normalized = normalized.astype({
+        'Currency': 'category',
+        'Source': 'category',
+        'Internal_Transfer': 'bool'
+    })
+
     return normalized
 
 
@@ -700,6 +969,47 @@ def normalize_dataframe(df: pd.DataFrame, column_mapping: Dict[str, str], source
 # INTERNAL TRANSFER DETECTION
 # ============================================================================
 
+def ingest_file(file) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Parse an uploaded CSV or PDF file into a raw DataFrame.
+    
+    Returns:
+        Tuple of (DataFrame, PDF extraction method or None for CSV files)
+    """
+    if file.name.lower().endswith('.pdf'):
+        return pdf_to_dataframe(file, file.name)
+    return load_csv_file(file), None
+
+
+def ingest_file_in_container(file, container, script_run_ctx) -> Tuple[pd.DataFrame, Optional[str]]:
+    """
+    Run ingest_file in a worker thread.
+    
+    The thread is attached to the Streamlit script run, so messages shown while
+    parsing (encoding warnings, PDF hints) are rendered in the file's container.
+    """
+    add_script_run_ctx(threading.current_thread(), script_run_ctx)
+    with container:
+        return ingest_file(file)
+
+
+def merge_dataframes(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate normalized DataFrames, keeping categorical columns categorical.
+    
+    pd.concat turns categoricals whose categories differ between the frames
+    (Source always does) into object columns, so all frames are first given
+    the union of the categories.
+    """
+    frames = [frame.copy(deep=False) for frame in frames]
+    for col in frames[0].select_dtypes(include=['category']).columns:
+        categories = union_categoricals([frame[col] for frame in frames]).categories
+        for frame in frames:
+            frame[col] = frame[col].cat.set_categories(categories)
+    
+    return pd.concat(frames, ignore_index=True)
+
+
 def detect_internal_transfers(df: pd.DataFrame, user_name: str = '', tolerance: float = 0.01) -> pd.DataFrame:
     """
     Detect and mark internal transfers.
@@ -712,43 +1022,58 @@ def detect_internal_transfers(df: pd.DataFrame, user_name: str = '', tolerance:
     """
     df = df.copy()
     
+    # Work on plain NumPy arrays and write the flags back once at the end
+    flags = df['Internal_Transfer'].to_numpy(dtype=bool, copy=True)
+    amounts = df['Amount'].to_numpy(dtype='float64')
+    dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+    
     # Exclude investment-related transactions from internal transfer detection
-    investment_keywords = ['WP-', 'Wertpapier', 'ETF', 'ISIN', 'Kauf', 'Verkauf', 'Dividende', 'Zins']
-    is_investment = df['Description'].str.contains('|'.join(investment_keywords), case=False, na=False, regex=True)
+    is_investment = df['Description'].str.contains(_INVEST_RE, na=False, regex=True).to_numpy()
     
     # Mark transfers to/from user's own name (but not investments)
     if user_name:
         user_pattern = re.compile(re.escape(user_name), re.IGNORECASE)
-        matches_user = df['Account'].str.contains(user_pattern, na=False, regex=True)
-        df.loc[matches_user & ~is_investment, 'Internal_Transfer'] = True
-    
-    # Find matching transactions (opposite amounts, similar dates)
-    for idx, row in df.iterrows():
-        if df.loc[idx, 'Internal_Transfer'] or is_investment[idx]:
-            continue
-        
-        amount = row['Amount']
-        date = row['Date']
-        
-        if pd.isna(date) or amount == 0:
-            continue
-        
-        # Look for opposite transaction
-        opposite_amount = -amount
-        
-        # Find matches within tolerance (excluding investments)
-        matches = df[
-            (df.index != idx) &
-            (~df['Internal_Transfer']) &
-            (~is_investment) &
-            (df['Amount'].between(opposite_amount - tolerance, opposite_amount + tolerance)) &
-            (abs((df['Date'] - date).dt.days) <= 2)  # Within 2 days
-        ]
-        
-        if len(matches) > 0:
-            df.loc[idx, 'Internal_Transfer'] = True
-            df.loc[matches.index[0], 'Internal_Transfer'] = True
-    
+        matches_user = df['Account'].str.contains(user_pattern, na=False, regex=True).to_numpy()
+        flags |= matches_user & ~is_investment
+    
+    # Find matching transactions (outgoing vs. incoming amount, similar dates):
+    # sort the credits by amount, then look up the range of matching credits
+    # for every debit with a binary search. The range is searched with twice
+    # the tolerance so float rounding can't drop pairs; the exact check follows.
+    rows = np.flatnonzero(~flags & ~is_investment & ~np.isnat(dates))
+    debits = rows[amounts[rows] < 0]
+    credits = rows[amounts[rows] > 0]
+    credits = credits[np.argsort(amounts[credits], kind='stable')]
+    credit_amounts = amounts[credits]
+    
+    lo = np.searchsorted(credit_amounts, -amounts[debits] - 2 * tolerance, side='left')
+    hi = np.searchsorted(credit_amounts, -amounts[debits] + 2 * tolerance, side='right')
+    counts = hi - lo
+    
+    # Expand each debit's range into (debit, credit) pairs
+    row_a = np.repeat(debits, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    row_b = credits[np.repeat(lo, counts) + offsets]
+    
+    # Each transaction pairs with at most one counterpart: in row order, every
+    # row takes its first counterpart that isn't paired yet. Amount and date
+    # window are measured from that row, so check both directions of each pair.
+    row = np.concatenate([row_a, row_b])
+    other = np.concatenate([row_b, row_a])
+    is_match = (
+        (amounts[other] >= -amounts[row] - tolerance) &
+        (amounts[other] <= -amounts[row] + tolerance) &
+        (np.abs((dates[other] - dates[row]) // np.timedelta64(1, 'D')) <= 2)  # Within 2 days
+    )
+    row = row[is_match]
+    other = other[is_match]
+    order = np.lexsort((other, row))
+    paired = np.zeros(len(df), dtype=bool)
+    for a, b in zip(row[order].tolist(), other[order].tolist()):
+        if not paired[a] and not paired[b]:
+            paired[a] = paired[b] = True
+    
+    df['Internal_Transfer'] = flags | paired
     return df
 
 
@@ -756,190 +1081,589 @@ def detect_internal_transfers(df: pd.DataFrame, user_name: str = '', tolerance:
 # OLLAMA CLASSIFICATION
 # ============================================================================
 
-def classify_with_ollama(
-    description: str,
-    account: str,
+@lru_cache(maxsize=8)
+def system_message(system_prompt: str) -> Dict[str, str]:
+    """Chat message for the system prompt, built once and shared by all requests."""
+    return {"role": "system", "content": system_prompt}
+
+
+@st.cache_resource(ttl=OLLAMA_KEEP_ALIVE, show_spinner="Loading model...")
+def warm_up_model(model: str, system_prompt: str):
+    """
+    Load the model and prefill the system prompt before the first real request.
+    
+    Every classification request starts with the same system message, so once
+    it has been processed Ollama can reuse the cached prompt prefix for all
+    following batches as long as the model stays loaded (see OLLAMA_KEEP_ALIVE).
+    
+    Cached per (model, system_prompt) for the keep-alive period, so reruns and
+    other browser sessions don't warm up again. Errors are raised, so a failed
+    warm-up is not cached.
+    """
+    OLLAMA_CLIENT.chat(
+        model=model,
+        messages=[
+            system_message(system_prompt),
+            {"role": "user", "content": "Test"}
+        ],
+        options={'num_predict': 1},
+        keep_alive=OLLAMA_KEEP_ALIVE
+    )
+
+
+def build_batch_prompt(transactions_batch: List[Tuple[str, str, float]], structured: bool = False, allow_unsure: bool = False) -> str:
+    """Build the user prompt asking for one category per numbered transaction."""
+    # Build a numbered list of transactions with amount information
+    transactions_text = "\n".join(
+        f"{i}. Betrag: €{amount:.2f}, Konto/Empfänger: {account}, Beschreibung: {description}"
+        for i, (account, description, amount) in enumerate(transactions_batch, 1)
+    )
+    
+    if structured:
+        # The JSON schema passed as format enforces the shape and the allowed values
+        answer_format = 'Antworte als JSON: {"categories": ["Kategorie für 1", "Kategorie für 2", ...]}'
+    else:
+        answer_format = """Antworte im Format:
+1. [Kategorie]
+2. [Kategorie]
+3. [Kategorie]
+..."""
+    
+    if allow_unsure:
+        answer_format += f"\nWenn du dir bei einer Transaktion nicht sicher bist, antworte dafür mit '{UNSURE_ANSWER}'."
+    
+    # Prompt asking for one category per transaction, in order
+    return f"""Hier sind {len(transactions_batch)} Transaktionen. Gib für jede die Kategorie zurück.
+Wichtig: Positive Beträge sind Einnahmen, negative Beträge sind Ausgaben.
+
+{transactions_text}
+
+{answer_format}"""
+
+
+def batch_response_format(categories: List[str], batch_length: int) -> Dict:
+    """JSON schema allowing exactly batch_length answers, each one of the categories."""
+    return {
+        'type': 'object',
+        'properties': {
+            'categories': {
+                'type': 'array',
+                'items': {'type': 'string', 'enum': categories},
+                'minItems': batch_length,
+                'maxItems': batch_length
+            }
+        },
+        'required': ['categories']
+    }
+
+
+def batch_chat_request(
+    transactions_batch: List[Tuple[str, str, float]],
     system_prompt: str,
-    model: str = "qwen3:4b-instruct-2507-q4_K_M"
-) -> str:
+    model: str,
+    categories: Optional[List[str]] = None
+) -> Dict:
+    """
+    Build the chat() arguments for classifying one batch.
+    
+    If categories are given, the answer is constrained to them with Ollama's
+    structured outputs, so the model can't answer anything else and stops
+    right after the last category. Decoding is greedy (temperature 0) so the
+    same transaction always gets the same, cacheable answer.
     """
-    Classify transaction using Ollama.
+    request = {
+        'model': model,
+        'messages': [
+            system_message(system_prompt),
+            {"role": "user", "content": build_batch_prompt(
+                transactions_batch,
+                structured=bool(categories),
+                allow_unsure=bool(categories) and UNSURE_ANSWER in categories
+            )}
+        ],
+        'options': {
+            'temperature': 0,
+            'num_predict': MAX_TOKENS_PER_CATEGORY * (len(transactions_batch) + 1)
+        },
+        'keep_alive': OLLAMA_KEEP_ALIVE
+    }
+    if categories:
+        request['format'] = batch_response_format(categories, len(transactions_batch))
+    return request
+
+
+def extract_batch_categories(response_text: str) -> List[str]:
+    """Extract all categories from a JSON or numbered-list response, in order."""
+    categories = []
+    
+    # Structured output: {"categories": [...]}
+    try:
+        parsed = json.loads(response_text)
+        if isinstance(parsed, dict) and isinstance(parsed.get('categories'), list):
+            categories = [str(category).strip() for category in parsed['categories']]
+    except ValueError:
+        pass
+    
+    for line in ([] if categories else response_text.splitlines()):
+        line = line.strip()
+        # Match patterns like "1. Kategorie" or "1) Kategorie" or "1 - Kategorie"
+        number_prefix = _NUM_PREFIX_RE.match(line)
+        if number_prefix:
+            # Remove the number prefix
+            categories.append(line[number_prefix.end():].strip())
+    
+    return categories
+
+
+def parse_batch_response(response_text: str, batch_length: int) -> List[str]:
+    """Extract exactly batch_length categories from a JSON or numbered-list response."""
+    categories = extract_batch_categories(response_text)
+    
+    # If we didn't get enough categories, pad with "Sonstiges"
+    while len(categories) < batch_length:
+        categories.append("Sonstiges")
+    
+    # If we got too many, truncate
+    return categories[:batch_length]
+
+
+async def classify_batch_with_ollama_async(
+    client: ollama.AsyncClient,
+    transactions_batch: List[Tuple[str, str, float]],
+    system_prompt: str,
+    model: str,
+    categories: Optional[List[str]] = None
+) -> List[str]:
+    """
+    Classify multiple transactions in one Ollama request using a shared AsyncClient.
+    
+    Request errors are raised to the caller. If the answer doesn't contain exactly
+    one category per transaction, the model lost track of the numbering and the
+    transactions are classified one by one.
     
     Args:
-        description: Transaction description
-        account: Account/recipient
+        client: AsyncClient shared by all requests of a classification run
+        transactions_batch: List of (account, description, amount) tuples
         system_prompt: System prompt for classification
         model: Ollama model name
+        categories: If given, only these categories are allowed as answers
     
     Returns:
-        Category name
+        List of category names
     """
-    try:
-        # Construct user prompt
-        user_prompt = f"{account}, {description}"
-        
-        # Call Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        
-        # Extract and clean response
-        category = response["message"]["content"].strip()
+    response = await client.chat(**batch_chat_request(transactions_batch, system_prompt, model, categories))
+    batch_categories = extract_batch_categories(response["message"]["content"])
+    if len(batch_categories) != len(transactions_batch) and len(transactions_batch) > 1:
+        # Retry one by one, sequentially so the worker keeps a single request in flight
+        retried = []
+        for transaction in transactions_batch:
+            retried += await classify_batch_with_ollama_async(client, [transaction], system_prompt, model, categories)
+        return retried
+    return parse_batch_response(response["message"]["content"], len(transactions_batch))
+
+
+async def classify_batches_async(
+    batches: List[Tuple[List, List[Tuple[str, str, float]]]],
+    system_prompt: str,
+    model: str,
+    on_batch_done: Callable[[List, List[str], bool], bool],
+    categories: Optional[List[str]] = None
+):
+    """
+    Send all batches to Ollama through a pool of OLLAMA_NUM_PARALLEL workers.
+    
+    Each worker takes the next batch from a shared queue as soon as its previous
+    request finishes, so Ollama always has exactly as many requests as it serves
+    in parallel and the remaining batches wait on our side.
+    
+    Args:
+        batches: List of (transaction ids, (account, description, amount) tuples) pairs
+        system_prompt: System prompt for classification
+        model: Ollama model name
+        on_batch_done: Called with (transaction ids, categories, succeeded) as each batch
+            finishes, in completion order. Failed batches get "Sonstiges" for every
+            row and succeeded=False. Returning False cancels the remaining batches.
+        categories: If given, only these categories are allowed as answers
+    """
+    pending: asyncio.Queue = asyncio.Queue()
+    finished: asyncio.Queue = asyncio.Queue()
+    for batch in batches:
+        pending.put_nowait(batch)
+    
+    # Closing the client releases its connections before asyncio.run closes the loop
+    async with ollama.AsyncClient() as client:
+        async def worker():
+            while True:
+                batch_ids, batch_data = await pending.get()
+                try:
+                    batch_categories = await classify_batch_with_ollama_async(client, batch_data, system_prompt, model, categories)
+                    finished.put_nowait((batch_ids, batch_categories, True))
+                except Exception as e:
+                    st.warning(f"Batch classification failed: {e}")
+                    # Return default category for all
+                    finished.put_nowait((batch_ids, ["Sonstiges"] * len(batch_data), False))
         
-        return category
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, min(OLLAMA_NUM_PARALLEL, len(batches))))]
+        try:
+            for _ in range(len(batches)):
+                if not on_batch_done(*(await finished.get())):
+                    break
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+
+def classification_cache_key(
+    account: str,
+    description: str,
+    amount: float,
+    model: str,
+    system_prompt: str,
+    categories: Optional[List[str]] = None
+) -> str:
+    """
+    Build the persistent cache key for a transaction.
+    
+    Numbers in the description (dates, reference numbers) are masked so
+    recurring payments share one entry. Direction, model, system prompt and
+    the allowed categories are part of the key because they all change the
+    answer. The key is a fixed-size 128-bit BLAKE2b digest of these parts.
+    """
+    account = str(account).strip().lower()
+    description = _DIGITS_RE.sub('#', str(description).strip().lower())
+    direction = 'in' if amount > 0 else 'out'
+    # Unconstrained answers are marked with an empty category list
+    allowed = ','.join(sorted(categories)) if categories else ''
+    content = '|'.join([model, system_prompt, allowed, direction, account, description])
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _open_classification_cache() -> sqlite3.Connection:
+    """Open the persistent classification cache, creating the table on first use."""
+    conn = sqlite3.connect(CLASSIFICATION_CACHE_FILE)
+    # WAL with relaxed syncing makes the frequent small per-batch writes cheap
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS categories (key TEXT PRIMARY KEY, category TEXT NOT NULL)")
+    return conn
+
+
+@st.cache_resource
+def _category_memo() -> Dict[str, str]:
+    """In-memory layer in front of the persistent cache, shared across reruns."""
+    return {}
+
+
+def load_cached_categories(keys) -> Dict[str, str]:
+    """Look up previously classified transactions, in memory first, then on disk."""
+    memo = _category_memo()
+    found = {key: memo[key] for key in keys if key in memo}
+    missing = [key for key in keys if key not in memo]
+    if not missing:
+        return found
+    
+    from_disk = {}
+    try:
+        with closing(_open_classification_cache()) as conn:
+            for start in range(0, len(missing), CACHE_LOOKUP_CHUNK):
+                chunk = missing[start:start + CACHE_LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                from_disk.update(conn.execute(f"SELECT key, category FROM categories WHERE key IN ({placeholders})", chunk))
+    except Exception as e:
+        st.warning(f"Could not read classification cache: {e}")
+        return found
     
+    memo.update(from_disk)
+    found.update(from_disk)
+    return found
+
+
+def store_cached_categories(categories: Dict[str, str]):
+    """Add newly classified transactions to the in-memory and persistent cache."""
+    if not categories:
+        return
+    _category_memo().update(categories)
+    try:
+        with closing(_open_classification_cache()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO categories (key, category) VALUES (?, ?)", categories.items())
     except Exception as e:
-        st.warning(f"Ollama classification failed: {e}")
-        return "Sonstiges"
+        st.warning(f"Could not update classification cache: {e}")
+
+
+def clear_classification_cache():
+    """Delete all entries of the in-memory and persistent classification cache."""
+    _category_memo().clear()
+    with closing(_open_classification_cache()) as conn, conn:
+        conn.execute("DELETE FROM categories")
 
 
-def classify_batch_with_ollama(transactions_batch: List[Dict], system_prompt: str, model: str) -> List[str]:
+def match_keyword_rules(transactions: pd.DataFrame, rules: Dict[str, str]) -> pd.Series:
     """
-    Classify multiple transactions in one Ollama request.
+    Categorize expenses by the first rule whose pattern matches.
     
     Args:
-        transactions_batch: List of transaction dicts with 'account', 'description', and 'amount'
-        system_prompt: System prompt for classification
-        model: Ollama model name
+        transactions: DataFrame with Account, Description and Amount columns
+        rules: Mapping of regular expression (matched case-insensitively against
+            account and description) to category
     
     Returns:
-        List of category names
+        Series of categories aligned with transactions, NaN where no rule matched
     """
-    try:
-        # Build a numbered list of transactions with amount information
-        transactions_text = "\n".join([
-            f"{i+1}. Betrag: €{t['amount']:.2f}, Konto/Empfänger: {t['account']}, Beschreibung: {t['description']}"
-            for i, t in enumerate(transactions_batch)
-        ])
-        
-        # Prompt asking for numbered categories
-        user_prompt = f"""Hier sind {len(transactions_batch)} Transaktionen. Gib für jede die Kategorie zurück.
-Wichtig: Positive Beträge sind Einnahmen, negative Beträge sind Ausgaben.
+    matched = pd.Series(np.nan, index=transactions.index, dtype=object)
+    # Income is left to Ollama, e.g. an Amazon refund is "Erstattung"
+    unmatched = transactions['Amount'].to_numpy() < 0
+    if not unmatched.any():
+        return matched
+    
+    text = transactions['Account'].astype(str) + ' ' + transactions['Description'].astype(str)
+    for pattern, category in rules.items():
+        try:
+            hits = unmatched & text.str.contains(pattern, case=False, regex=True, na=False).to_numpy()
+        except re.error as e:
+            st.warning(f"Invalid keyword rule '{pattern}': {e}")
+            continue
+        matched[hits] = category
+        unmatched &= ~hits
+    
+    return matched
 
-{transactions_text}
 
-Antworte im Format:
-1. [Kategorie]
-2. [Kategorie]
-3. [Kategorie]
-..."""
-        
-        # Call Ollama
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
-        
-        # Parse response - extract categories from numbered list
-        response_text = response["message"]["content"].strip()
-        categories = []
-        
-        for line in response_text.split('\n'):
-            line = line.strip()
-            # Match patterns like "1. Kategorie" or "1) Kategorie" or "1 - Kategorie"
-            if re.match(r'^\d+[\.\)\-\:]?\s*', line):
-                # Remove the number prefix
-                category = re.sub(r'^\d+[\.\)\-\:]?\s*', '', line).strip()
-                categories.append(category)
-        
-        # If we didn't get enough categories, pad with "Sonstiges"
-        while len(categories) < len(transactions_batch):
-            categories.append("Sonstiges")
-        
-        # If we got too many, truncate
-        categories = categories[:len(transactions_batch)]
-        
-        return categories
+def apply_keyword_rules(df: pd.DataFrame, positions: np.ndarray, rules: Dict[str, str]) -> np.ndarray:
+    """Categorize the rows at positions that match a rule, return the positions left for Ollama."""
+    rule_categories = match_keyword_rules(df.iloc[positions], rules)
+    has_rule = rule_categories.notna().to_numpy()
+    df.iloc[positions[has_rule], df.columns.get_loc('Category')] = rule_categories[has_rule].to_numpy()
+    return positions[~has_rule]
+
+
+def classification_cancelled() -> bool:
+    """Check if the user asked to cancel the running classification."""
+    return st.session_state.get('cancel_classification', False)
+
+
+def make_batches(df: pd.DataFrame, pending_keys: pd.Series, size: int) -> List[Tuple[List, List[Tuple[str, str, float]]]]:
+    """Split cache keys (indexed by row position) into batches, with one representative row per key."""
+    rows = df.iloc[pending_keys.index]
+    batch_keys = pending_keys.tolist()
+    batch_data = list(zip(
+        rows['Account'].astype(str).tolist(),
+        rows['Description'].astype(str).tolist(),
+        rows['Amount'].astype(float).tolist()
+    ))
+    return [
+        (batch_keys[start:start + size], batch_data[start:start + size])
+        for start in range(0, len(batch_keys), size)
+    ]
+
+
+def run_batches(
+    df: pd.DataFrame,
+    pending_keys: pd.Series,
+    batch_size: int,
+    system_prompt: str,
+    model: str,
+    on_batch_done: Callable[[List, List[str], bool], bool],
+    categories: Optional[List[str]] = None
+):
+    """Classify pending_keys in batches of batch_size, see classify_batches_async."""
+    asyncio.run(classify_batches_async(make_batches(df, pending_keys, batch_size), system_prompt, model, on_batch_done, categories))
+
+
+def tune_batch_size(
+    df: pd.DataFrame,
+    pending_keys: pd.Series,
+    system_prompt: str,
+    model: str,
+    on_batch_done: Callable[[List, List[str], bool], bool],
+    categories: Optional[List[str]] = None
+) -> Tuple[Optional[int], pd.Series]:
+    """
+    Find the batch size that classifies the most rows per second.
     
-    except Exception as e:
-        st.warning(f"Batch classification failed: {e}")
-        # Return default category for all
-        return ["Sonstiges"] * len(transactions_batch)
+    Each size in BATCH_SIZE_CANDIDATES is timed with OLLAMA_NUM_PARALLEL
+    batches in flight, the same concurrency the remaining batches run at.
+    Larger batches take longer per request but usually classify more rows
+    per second, up to a model-dependent limit. Once every
+    candidate was measured, the result is remembered per model in
+    st.session_state['tuned_bs'].
+    
+    Returns:
+        Tuple of (best batch size or None if nothing was measured, keys still to classify)
+    """
+    tuned_sizes = st.session_state.setdefault('tuned_bs', {})
+    if model in tuned_sizes:
+        return tuned_sizes[model], pending_keys
+    
+    rows_per_sec = {}
+    for candidate in BATCH_SIZE_CANDIDATES:
+        sample_size = candidate * OLLAMA_NUM_PARALLEL
+        if len(pending_keys) < sample_size or classification_cancelled():
+            break
+        # Only time the Ollama round-trips, results are applied afterwards
+        outcome = []
+        start = time.perf_counter()
+        run_batches(df, pending_keys.iloc[:sample_size], candidate, system_prompt, model, lambda *result: outcome.append(result) or True, categories)
+        elapsed = time.perf_counter() - start
+        pending_keys = pending_keys.iloc[sample_size:]
+        rows_per_sec[candidate] = sum(len(batch_keys) for batch_keys, _, succeeded in outcome if succeeded) / elapsed
+        if not all(on_batch_done(*result) for result in outcome):
+            break
+    
+    if not rows_per_sec:
+        return None, pending_keys
+    best_size = max(rows_per_sec, key=rows_per_sec.get)
+    if len(rows_per_sec) == len(BATCH_SIZE_CANDIDATES):
+        tuned_sizes[model] = best_size
+    return best_size, pending_keys
+
 
+def find_uncertain_keys(keys: pd.Series, category_by_key: Dict[str, str], categories: Optional[List[str]] = None) -> pd.Series:
+    """Keys whose answer is not one of the categories, e.g. UNSURE_ANSWER. Keys without answer are skipped."""
+    known_categories = set(categories or DEFAULT_CATEGORIES)
+    answers = keys.map(category_by_key)
+    return keys[answers.notna() & ~answers.isin(known_categories)]
 
-def classify_transactions(df: pd.DataFrame, system_prompt: str, model: str = "qwen3:4b-instruct-2507-q4_K_M", batch_size: int = 10, exclude_internal: bool = True) -> pd.DataFrame:
+
+def classify_transactions(
+    df: pd.DataFrame,
+    system_prompt: str,
+    model: str = "qwen3:4b-instruct-2507-q4_K_M",
+    batch_size: int = 10,
+    exclude_internal: bool = True,
+    auto_tune: bool = False,
+    categories: Optional[List[str]] = None,
+    on_progress: Optional[Callable[[pd.DataFrame, np.ndarray], None]] = None,
+    keyword_rules: Optional[Dict[str, str]] = None,
+    fallback_model: Optional[str] = None,
+    limit: Optional[int] = None,
+    sample: bool = False
+) -> pd.DataFrame:
     """
     Classify all transactions in DataFrame using Ollama with batch processing.
     
+    Each cache key (see classification_cache_key) is sent to Ollama at most once
+    and its answer applied to all rows sharing it. Results are written to the
+    DataFrame and the cache as each batch completes.
+    
     Args:
         df: DataFrame with transactions
         system_prompt: System prompt
         model: Ollama model
         batch_size: Number of transactions to classify in one request
         exclude_internal: If True, exclude internal transfers from classification
+        auto_tune: If True, measure the best batch size first (see tune_batch_size)
+        categories: If given, Ollama may only answer with one of these categories
+        on_progress: Called with the DataFrame and the row positions of each finished batch
+        keyword_rules: Pattern -> category rules applied to expenses before Ollama
+        fallback_model: Larger Ollama model re-checking answers outside the categories
+        limit: If given, only classify this many transactions
+        sample: If True, pick the limit transactions at random instead of the first ones
     
     Returns:
         DataFrame with Category column filled
     """
     df = df.copy()
     
-    # Only classify non-internal transfers if exclude_internal is True
+    # Only classify non-internal transfers if exclude_internal is True.
+    # Rows are tracked by position so results can be written back with iloc.
     if exclude_internal:
-        to_classify_indices = df[~df['Internal_Transfer']].index.tolist()
+        # Mark internal transfers up front, so partial results already exclude them
+        df.loc[df['Internal_Transfer'], 'Category'] = 'Internal Transfer'
+        positions = np.flatnonzero(~df['Internal_Transfer'].to_numpy())
     else:
-        to_classify_indices = df.index.tolist()
+        positions = np.arange(len(df))
     
-    total = len(to_classify_indices)
+    # Classify only part of the transactions, the others keep their category
+    if limit is not None and limit < len(positions):
+        if sample:
+            positions = np.sort(np.random.default_rng().choice(positions, size=limit, replace=False))
+        else:
+            positions = positions[:limit]
+    
+    if keyword_rules:
+        positions = apply_keyword_rules(df, positions, keyword_rules)
+    to_classify = df.iloc[positions]
+    
+    # With a fallback model, the model may answer UNSURE_ANSWER to have a transaction re-checked
+    escalate = bool(fallback_model) and fallback_model != model
+    allowed = [*categories, UNSURE_ANSWER] if escalate and categories else categories
+    
+    keys = pd.Series(
+        [
+            classification_cache_key(account, description, amount, model, system_prompt, allowed)
+            for account, description, amount in zip(to_classify['Account'], to_classify['Description'], to_classify['Amount'])
+        ],
+        index=positions,
+        dtype=object
+    )
     
-    if total == 0:
-        if exclude_internal:
-            df.loc[df['Internal_Transfer'], 'Category'] = 'Internal Transfer'
-        return df
+    # Reuse categories from earlier runs, classify each remaining key only once
+    category_by_key = load_cached_categories(set(keys))
+    cached_rows = int(keys.isin(category_by_key).sum())
+    unique_keys = keys[~keys.isin(category_by_key)].drop_duplicates()
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    total = len(unique_keys)
     
-    # Process in batches
-    completed = 0
+    # Uncertain answers cached by an earlier, interrupted run are re-checked as well
+    has_uncertain = escalate and not find_uncertain_keys(keys.drop_duplicates(), category_by_key, categories).empty
     
-    for batch_start in range(0, total, batch_size):
-        # Check for cancellation
-        if st.session_state.get('cancel_classification', False):
-            status_text.text("❌ Classification cancelled")
-            break
+    if total > 0 or has_uncertain:
+        # Positions of all rows sharing each key, to write a batch's results to all of them
+        key_positions = keys.index.to_numpy()
+        rows_by_key = keys.groupby(keys, sort=False).indices
+        category_col = df.columns.get_loc('Category')
         
-        batch_end = min(batch_start + batch_size, total)
-        batch_indices = to_classify_indices[batch_start:batch_end]
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        completed = 0
         
-        # Prepare batch data
-        batch_data = []
-        for idx in batch_indices:
-            row = df.loc[idx]
-            batch_data.append({
-                'account': str(row['Account']),
-                'description': str(row['Description']),
-                'amount': float(row['Amount'])
-            })
+        def on_batch_done(batch_keys: List[str], batch_categories: List[str], succeeded: bool) -> bool:
+            nonlocal completed
+            
+            category_by_key.update(zip(batch_keys, batch_categories))
+            if succeeded:
+                store_cached_categories(dict(zip(batch_keys, batch_categories)))
+            
+            # Apply the batch right away, so partial results are usable
+            batch_rows = [key_positions[rows_by_key[key]] for key in batch_keys]
+            df.iloc[np.concatenate(batch_rows), category_col] = np.repeat(batch_categories, [len(rows) for rows in batch_rows])
+            if on_progress is not None:
+                on_progress(df, np.concatenate(batch_rows))
+            
+            # Update progress
+            completed += len(batch_keys)
+            progress_bar.progress(completed / total)
+            status_text.text(f"Classified {completed}/{total} unique transactions (batches of {batch_size}, up to {OLLAMA_NUM_PARALLEL} in parallel, {cached_rows} rows from cache)")
+            
+            # Check for cancellation
+            if classification_cancelled():
+                status_text.text("❌ Classification cancelled")
+                return False
+            return True
         
-        # Classify the batch
-        batch_categories = classify_batch_with_ollama(batch_data, system_prompt, model)
+        remaining = unique_keys
+        if auto_tune:
+            tuned_size, remaining = tune_batch_size(df, remaining, system_prompt, model, on_batch_done, allowed)
+            batch_size = tuned_size or batch_size
         
-        # Assign categories back to dataframe
-        for idx, category in zip(batch_indices, batch_categories):
-            df.loc[idx, 'Category'] = category
+        if not remaining.empty and not classification_cancelled():
+            run_batches(df, remaining, batch_size, system_prompt, model, on_batch_done, allowed)
         
-        # Update progress
-        completed = batch_end
-        progress = completed / total
-        progress_bar.progress(progress)
+        # Escalate answers outside the known categories to the larger model
+        if escalate and not classification_cancelled():
+            uncertain = find_uncertain_keys(keys.drop_duplicates(), category_by_key, categories)
+            if not uncertain.empty:
+                total, completed = len(uncertain), 0
+                status_text.text(f"Re-checking {total} uncertain transactions with {fallback_model}...")
+                run_batches(df, uncertain, batch_size, system_prompt, fallback_model, on_batch_done, categories)
         
-        batch_num = (batch_start // batch_size) + 1
-        total_batches = (total + batch_size - 1) // batch_size
-        status_text.text(f"Classified {completed}/{total} transactions (Batch {batch_num}/{total_batches}, {batch_size} per batch)")
+        progress_bar.empty()
+        status_text.empty()
     
-    progress_bar.empty()
-    status_text.empty()
-    
-    # Mark internal transfers if they should be excluded
-    if exclude_internal:
-        df.loc[df['Internal_Transfer'], 'Category'] = 'Internal Transfer'
+    # Assign categories back to every row sharing a key in one positional write
+    classified = keys.map(category_by_key).dropna()
+    df.iloc[classified.index, df.columns.get_loc('Category')] = classified.to_numpy()
     
     return df
 
@@ -958,8 +1682,13 @@ def main():
     st.title("💰 Bank Transaction Analyzer")
     st.markdown("*Fully local transaction processing and classification*")
     
-    # Check if Ollama is available
-    ollama_available, error_type = check_ollama_available()
+    # Check if Ollama is available. A successful check is remembered for the
+    # session so reruns don't query the Ollama API again; failures are re-checked.
+    if st.session_state.get('ollama_available'):
+        ollama_available, error_type = True, ""
+    else:
+        ollama_available, error_type = check_ollama_available()
+        st.session_state.ollama_available = ollama_available
     
     if not ollama_available:
         st.error("### ⚠️ Ollama is Required")
@@ -1041,17 +1770,19 @@ def main():
         st.subheader("Ollama Settings")
         st.markdown("🔗 [Browse Models](https://ollama.com/library) on Ollama website")
         
-        available_models = [
+        model_profiles = st.session_state.config.get('models', MODEL_PROFILES)
+        profile_by_model = {m: p for p, m in reversed(list(model_profiles.items()))}
+        available_models = list(dict.fromkeys([
             "gemma3:4b",
-            "qwen3:4b-instruct-2507-q4_K_M",
+            *model_profiles.values(),
             "llama3.2:3b",
-        ]
+        ]))
         
         # Get list of downloaded models
         downloaded_models = get_available_ollama_models()
         
-        # Format model options with availability indicator
-        model_options = [format_model_option(m, downloaded_models) for m in available_models]
+        # Format model options with profile and availability indicator
+        model_options = [format_model_option(m, downloaded_models, profile_by_model.get(m)) for m in available_models]
         
         # Get saved model or use default
         default_model = st.session_state.config.get('ollama_model', available_models[0])
@@ -1062,7 +1793,8 @@ def main():
             "Select Model",
             options=model_options,
             index=available_models.index(default_model),
-            help="Choose the Ollama model for transaction classification. ✓ = downloaded and ready. Models marked '(not downloaded)' need to be pulled first."
+            help="Choose the Ollama model for transaction classification. ✓ = downloaded and ready. Models marked '(not downloaded)' need to be pulled first. "
+                 "'fast' is best on CPU-only machines, 'accurate' needs more memory."
         )
         
         # Extract actual model name from the formatted option
@@ -1086,7 +1818,7 @@ def main():
                     try:
                         # Stream the pull progress
                         progress_placeholder = st.empty()
-                        for progress in ollama.pull(model, stream=True):
+                        for progress in OLLAMA_CLIENT.pull(model, stream=True):
                             if 'status' in progress:
                                 status = progress['status']
                                 if 'completed' in progress and 'total' in progress:
@@ -1096,6 +1828,7 @@ def main():
                                     progress_placeholder.text(status)
                         
                         st.session_state[f'downloading_{model}'] = False
+                        get_available_ollama_models.clear()
                         st.success(f"✓ Successfully downloaded {model}")
                         st.rerun()
                     except Exception as e:
@@ -1110,7 +1843,27 @@ def main():
             height=200
         )
         st.session_state.config['system_prompt'] = system_prompt
+
+        # Preload the selected model so the first batch doesn't pay the cold start
+        if "(not downloaded)" not in selected_option:
+            try:
+                warm_up_model(model, system_prompt)
+            except Exception:
+                pass  # Not critical - the first real request will load the model instead
         
+        # Larger model for answers the selected model is unsure about
+        fallback_model = model_profiles.get('accurate')
+        escalate_uncertain = False
+        if fallback_model and fallback_model != model:
+            fallback_ready = is_model_downloaded(fallback_model, downloaded_models)
+            escalate_uncertain = st.checkbox(
+                f"Re-check uncertain answers with {fallback_model}",
+                value=fallback_ready,
+                disabled=not fallback_ready,
+                help=f"The selected model may answer '{UNSURE_ANSWER}' when it is unsure, those transactions are classified again with the 'accurate' model. "
+                     "Needs that model downloaded; set OLLAMA_MAX_LOADED_MODELS=2 to keep both models loaded."
+            )
+
         # Save config
         if st.button("💾 Save Configuration"):
             save_config(st.session_state.config)
@@ -1133,110 +1886,125 @@ def main():
             
             all_dataframes = []
             
+            # Parse all files in parallel - PDF extraction and OCR are slow and
+            # independent per file. Every file gets its own container, created
+            # here in upload order, so messages from the workers land in it.
+            containers = []
             for file in uploaded_files:
-                st.subheader(f"Processing: {file.name}")
+                container = st.container()
+                container.subheader(f"Processing: {file.name}")
+                containers.append(container)
+            
+            with ThreadPoolExecutor(max_workers=min(8, len(uploaded_files))) as executor:
+                script_run_ctx = get_script_run_ctx()
+                futures = [
+                    executor.submit(ingest_file_in_container, file, container, script_run_ctx)
+                    for file, container in zip(uploaded_files, containers)
+                ]
                 
-                try:
-                    # Determine file type
-                    if file.name.lower().endswith('.pdf'):
-                        # Process PDF
-                        df, method = pdf_to_dataframe(file, file.name)
-                        
-                        # Only show success message if extraction worked
-                        if not df.empty:
-                            st.success(f"✓ Extracted using: {method}")
-                        # Error messages already shown in pdf_to_dataframe function
-                        if df.empty:
-                            continue
-                    else:
-                        # Process CSV
-                        df = load_csv_file(file)
-                    
-                    # Show encoding info
-                    if hasattr(df, 'attrs') and 'detected_encoding' in df.attrs:
-                        st.info(f"📝 Detected encoding: **{df.attrs['detected_encoding']}**, delimiter: **{df.attrs.get('delimiter', ';')}**")
-                    
-                    # Show preview
-                    st.write("**Preview:**")
-                    st.dataframe(df.head())
-                    
-                    # Auto-detect columns
-                    detected = auto_detect_columns(df)
-                    
-                    st.write("**Column Mapping:**")
-                    with st.expander("ℹ️ How does column detection work?", expanded=False):
-                        st.markdown("""
-                        The app automatically detects columns by matching common names:
-                        - **Date**: datum, date, buchung, valuta, buchungstag, wertstellung
-                        - **Description**: beschreibung, verwendungszweck, buchungstext, text, details
-                        - **Amount**: betrag, amount, wert, value, sum, summe
-                        - **Account/Recipient**: auftraggeber, empfänger, auftraggeber/empfänger, account, recipient
-                        - **Currency**: währung, currency, waehrung
-                        
-                        If detection fails, manually select the correct columns from the dropdowns below.
-                        """)
-                    
-                    # Manual column selection
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        date_col = st.selectbox(
-                            "Date Column",
-                            options=[''] + list(df.columns),
-                            index=list([''] + list(df.columns)).index(detected['date']) if detected['date'] else 0,
-                            key=f"date_{file.name}"
-                        )
-                        
-                        desc_col = st.selectbox(
-                            "Description Column",
-                            options=[''] + list(df.columns),
-                            index=list([''] + list(df.columns)).index(detected['description']) if detected['description'] else 0,
-                            key=f"desc_{file.name}"
-                        )
-                        
-                        amount_col = st.selectbox(
-                            "Amount Column",
-                            options=[''] + list(df.columns),
-                            index=list([''] + list(df.columns)).index(detected['amount']) if detected['amount'] else 0,
-                            key=f"amount_{file.name}"
-                        )
-                    
-                    with col2:
-                        account_col = st.selectbox(
-                            "Account/Recipient Column",
-                            options=[''] + list(df.columns),
-                            index=list([''] + list(df.columns)).index(detected['account']) if detected['account'] else 0,
-                            key=f"account_{file.name}"
-                        )
+                for file, container, future in zip(uploaded_files, containers, futures):
+                    with container:
+                        try:
+                            df, method = future.result()
+                            
+                            if method is not None:
+                                # Only show success message if extraction worked
+                                if not df.empty:
+                                    st.success(f"✓ Extracted using: {method}")
+                                # Error messages already shown in pdf_to_dataframe function
+                                if df.empty:
+                                    continue
+                            
+                            # Show encoding info
+                            if hasattr(df, 'attrs') and 'detected_encoding' in df.attrs:
+                                st.info(f"📝 Detected encoding: **{df.attrs['detected_encoding']}**, delimiter: **{df.attrs.get('delimiter', ';')}**")
+                            
+                            # Show preview
+                            st.write("**Preview:**")
+                            st.dataframe(df.head())
+                            
+                            # Auto-detect columns
+                            detected = auto_detect_columns(df)
+                            
+                            st.write("**Column Mapping:**")
+                            with st.expander("ℹ️ How does column detection work?", expanded=False):
+                                st.markdown("""
+                                The app automatically detects columns by matching common names:
+                                - **Date**: datum, date, buchung, valuta, buchungstag, wertstellung
+                                - **Description**: beschreibung, verwendungszweck, buchungstext, text, details
+                                - **Amount**: betrag, amount, wert, value, sum, summe
+                                - **Account/Recipient**: auftraggeber, empfänger, auftraggeber/empfänger, account, recipient
+                                - **Currency**: währung, currency, waehrung
+                                
+                                If detection fails, manually select the correct columns from the dropdowns below.
+                                """)
+                            
+                            # Manual column selection, options and positions built once per file
+                            column_options = [''] + list(df.columns)
+                            column_index = {}
+                            for i, col in enumerate(column_options):
+                                column_index.setdefault(col, i)  # First of duplicate names, like list.index
+                            
+                            col1, col2 = st.columns(2)
+                            
+                            with col1:
+                                date_col = st.selectbox(
+                                    "Date Column",
+                                    options=column_options,
+                                    index=column_index.get(detected['date'], 0),
+                                    key=f"date_{file.name}"
+                                )
+                                
+                                desc_col = st.selectbox(
+                                    "Description Column",
+                                    options=column_options,
+                                    index=column_index.get(detected['description'], 0),
+                                    key=f"desc_{file.name}"
+                                )
+                                
+                                amount_col = st.selectbox(
+                                    "Amount Column",
+                                    options=column_options,
+                                    index=column_index.get(detected['amount'], 0),
+                                    key=f"amount_{file.name}"
+                                )
+                            
+                            with col2:
+                                account_col = st.selectbox(
+                                    "Account/Recipient Column",
+                                    options=column_options,
+                                    index=column_index.get(detected['account'], 0),
+                                    key=f"account_{file.name}"
+                                )
+                                
+                                currency_col = st.selectbox(
+                                    "Currency Column (optional)",
+                                    options=column_options,
+                                    index=column_index.get(detected['currency'], 0),
+                                    key=f"currency_{file.name}"
+                                )
+                            
+                            # Normalize
+                            column_mapping = {
+                                'date': date_col if date_col else None,
+                                'description': desc_col if desc_col else None,
+                                'amount': amount_col if amount_col else None,
+                                'account': account_col if account_col else None,
+                                'currency': currency_col if currency_col else None,
+                            }
+                            
+                            normalized_df = normalize_dataframe(df, column_mapping, file.name)
+                            all_dataframes.append(normalized_df)
+                            
+                            st.success(f"✓ Processed {file.name}")
                         
-                        currency_col = st.selectbox(
-                            "Currency Column (optional)",
-                            options=[''] + list(df.columns),
-                            index=list([''] + list(df.columns)).index(detected['currency']) if detected['currency'] else 0,
-                            key=f"currency_{file.name}"
-                        )
-                    
-                    # Normalize
-                    column_mapping = {
-                        'date': date_col if date_col else None,
-                        'description': desc_col if desc_col else None,
-                        'amount': amount_col if amount_col else None,
-                        'account': account_col if account_col else None,
-                        'currency': currency_col if currency_col else None,
-                    }
-                    
-                    normalized_df = normalize_dataframe(df, column_mapping, file.name)
-                    all_dataframes.append(normalized_df)
-                    
-                    st.success(f"✓ Processed {file.name}")
-                
-                except Exception as e:
-                    st.error(f"Error processing {file.name}: {e}")
+                        except Exception as e:
+                            st.error(f"Error processing {file.name}: {e}")
             
             if all_dataframes:
                 # Merge all data
                 st.header("Merged Data")
-                merged_df = pd.concat(all_dataframes, ignore_index=True)
+                merged_df = merge_dataframes(all_dataframes)
                 
                 st.write(f"**Total transactions:** {len(merged_df)}")
                 st.dataframe(merged_df)
@@ -1315,6 +2083,23 @@ def main():
                         value=10, 
                         help="Number of transactions to classify in one Ollama request. Higher = faster but may reduce accuracy."
                     )
+                    auto_tune = st.checkbox(
+                        "Auto-tune batch size",
+                        value=False,
+                        help=f"Measure which of {', '.join(map(str, BATCH_SIZE_CANDIDATES))} transactions per batch is fastest for the selected model on the first batches. The result is reused for the rest of the session."
+                    )
+                    limit = st.number_input(
+                        "Only classify N transactions (0 = all)",
+                        min_value=0,
+                        value=0,
+                        step=10,
+                        help="Classify just part of the data, e.g. to quickly try out a system prompt or model."
+                    )
+                    sample = st.checkbox(
+                        "Random sample instead of the first N",
+                        value=False,
+                        disabled=limit == 0
+                    )
                 
                 with col2:
                     classify_button = st.button("🤖 Classify with Ollama", use_container_width=True)
@@ -1331,15 +2116,34 @@ def main():
                         # Reset cancel flag
                         st.session_state.cancel_classification = False
                         
-                        with st.spinner(f"Classifying transactions in batches of {batch_size}..."):
+                        live_preview = st.empty()
+                        
+                        def show_progress(partial_df: pd.DataFrame, batch_rows: np.ndarray):
+                            # Keep partial results in case the run is interrupted (e.g. by Cancel)
+                            st.session_state.processed_data = partial_df
+                            live_preview.dataframe(partial_df.iloc[batch_rows][['Date', 'Account', 'Description', 'Amount', 'Category']])
+                        
+                        spinner_text = "Classifying transactions..." if auto_tune else f"Classifying transactions in batches of {batch_size}..."
+                        with st.spinner(spinner_text):
                             classified_df = classify_transactions(
                                 st.session_state.processed_data,
                                 system_prompt=system_prompt,
                                 model=model,
                                 batch_size=batch_size,
-                                exclude_internal=exclude_internal
+                                exclude_internal=exclude_internal,
+                                auto_tune=auto_tune,
+                                categories=st.session_state.config.get('custom_categories', DEFAULT_CATEGORIES),
+                                on_progress=show_progress,
+                                keyword_rules=st.session_state.config.get('keyword_rules', KEYWORD_RULES),
+                                fallback_model=fallback_model if escalate_uncertain else None,
+                                limit=limit or None,
+                                sample=sample
                             )
                             st.session_state.processed_data = classified_df
+                        live_preview.empty()
+                        
+                        if auto_tune and model in st.session_state.get('tuned_bs', {}):
+                            st.info(f"Auto-tuned batch size for {model}: {st.session_state.tuned_bs[model]}")
                         
                         if st.session_state.get('cancel_classification', False):
                             st.warning("Classification cancelled by user")
@@ -1350,30 +2154,30 @@ def main():
                 if st.session_state.processed_data is not None:
                     st.subheader("Processed Transactions")
                     
-                    # Highlight internal transfers with light pink background and style the checkbox
-                    def highlight_internal(row):
-                        if row['Internal_Transfer']:
-                            return ['background-color: #ffcccc; color: #000000'] * len(row)
-                        return [''] * len(row)
+                    is_internal = st.session_state.processed_data['Internal_Transfer'].to_numpy(dtype=bool)
+                    
+                    # Highlight internal transfers with light pink background, all cells at once
+                    def highlight_internal(frame):
+                        styles = np.where(is_internal[:, None], 'background-color: #ffcccc; color: #000000', '')
+                        return pd.DataFrame(np.broadcast_to(styles, frame.shape), index=frame.index, columns=frame.columns)
                     
                     # Create a copy for display with better boolean formatting
-                    display_df = st.session_state.processed_data.copy()
+                    display_df = st.session_state.processed_data.copy(deep=False)
                     # Replace True/False with more visible symbols
-                    display_df['Internal_Transfer'] = display_df['Internal_Transfer'].apply(
-                        lambda x: '✓ Yes' if x else 'No'
-                    )
+                    display_df['Internal_Transfer'] = np.where(is_internal, '✓ Yes', 'No')
                     
-                    styled_df = display_df.style.apply(highlight_internal, axis=1)
+                    styled_df = display_df.style.apply(highlight_internal, axis=None)
                     st.dataframe(styled_df)
                     
                     # Export button
                     st.subheader("Export")
                     
-                    # Export with UTF-8 BOM for Excel compatibility
-                    csv = '\ufeff' + st.session_state.processed_data.to_csv(index=False, encoding='utf-8')
+                    # Export with UTF-8 BOM for Excel compatibility, encoded straight into bytes
+                    csv_buffer = io.BytesIO()
+                    st.session_state.processed_data.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
                     st.download_button(
                         label="📥 Download Unified CSV",
-                        data=csv.encode('utf-8'),
+                        data=csv_buffer.getvalue(),
                         file_name=f"transactions_unified_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         mime="text/csv"
                     )
@@ -1383,18 +2187,19 @@ def main():
                     st.subheader("📊 Quick Analysis Summary")
                     
                     df = st.session_state.processed_data
-                    analysis_df = df[~df['Internal_Transfer']].copy()
+                    analysis_df = df[~df['Internal_Transfer']]
+                    is_expense = analysis_df['Amount'] < 0
                     
                     if not analysis_df.empty:
                         # Key metrics in columns
                         col1, col2, col3, col4 = st.columns(4)
                         
                         with col1:
-                            total_income = analysis_df[analysis_df['Amount'] > 0]['Amount'].sum()
+                            total_income = analysis_df.loc[analysis_df['Amount'] > 0, 'Amount'].sum()
                             st.metric("💰 Total Income", f"€{total_income:,.2f}")
                         
                         with col2:
-                            total_expenses = abs(analysis_df[analysis_df['Amount'] < 0]['Amount'].sum())
+                            total_expenses = abs(analysis_df.loc[is_expense, 'Amount'].sum())
                             st.metric("💸 Total Expenses", f"€{total_expenses:,.2f}")
                         
                         with col3:
@@ -1410,10 +2215,9 @@ def main():
                         
                         # Top categories preview
                         st.markdown("#### Top Expense Categories")
-                        expense_df = analysis_df[analysis_df['Amount'] < 0].copy()
-                        if not expense_df.empty:
-                            expense_df['Amount'] = abs(expense_df['Amount'])
-                            top_expenses = expense_df.groupby('Category')['Amount'].sum().sort_values(ascending=False).head(5)
+                        if is_expense.any():
+                            # Take abs() of the per-category sums rather than of every row
+                            top_expenses = analysis_df.loc[is_expense].groupby('Category')['Amount'].sum().abs().sort_values(ascending=False).head(5)
                             
                             col1, col2 = st.columns([2, 1])
                             with col1:
@@ -1441,17 +2245,31 @@ def main():
             df = st.session_state.processed_data
             
             # Filter out internal transfers for analysis
-            analysis_df = df[~df['Internal_Transfer']].copy()
+            analysis_df = df[~df['Internal_Transfer']]
+            
+            # Income and expense totals per category in a single groupby.
+            # Unclassified rows (no category) only count towards the key metrics.
+            amounts = analysis_df['Amount']
+            direction = np.where(amounts > 0, 'income', np.where(amounts < 0, 'expense', 'zero'))
+            totals = (
+                amounts.groupby([analysis_df['Category'], direction], dropna=False, observed=True)
+                .sum()
+                .unstack(fill_value=0.0)
+                .reindex(columns=['income', 'expense'], fill_value=0.0)
+            )
+            classified_totals = totals[totals.index.notna()]
+            income_by_category = classified_totals.loc[classified_totals['income'] > 0, 'income']
+            expense_by_category = -classified_totals.loc[classified_totals['expense'] < 0, 'expense']
             
             # Key metrics
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                total_income = analysis_df[analysis_df['Amount'] > 0]['Amount'].sum()
+                total_income = totals['income'].sum()
                 st.metric("Total Income", f"€{total_income:,.2f}")
             
             with col2:
-                total_expenses = abs(analysis_df[analysis_df['Amount'] < 0]['Amount'].sum())
+                total_expenses = abs(totals['expense'].sum())
                 st.metric("Total Expenses", f"€{total_expenses:,.2f}")
             
             with col3:
@@ -1465,9 +2283,7 @@ def main():
             
             with col1:
                 st.markdown("### Income Sources")
-                income_df = analysis_df[analysis_df['Amount'] > 0].copy()
-                if not income_df.empty:
-                    income_by_category = income_df.groupby('Category')['Amount'].sum()
+                if not income_by_category.empty:
                     fig_income = {
                         'data': [{
                             'labels': income_by_category.index.tolist(),
@@ -1489,10 +2305,7 @@ def main():
             
             with col2:
                 st.markdown("### Expense Categories")
-                expense_df = analysis_df[analysis_df['Amount'] < 0].copy()
-                if not expense_df.empty:
-                    expense_df['Amount'] = abs(expense_df['Amount'])
-                    expense_by_category = expense_df.groupby('Category')['Amount'].sum()
+                if not expense_by_category.empty:
                     fig_expense = {
                         'data': [{
                             'labels': expense_by_category.index.tolist(),
@@ -1519,11 +2332,13 @@ def main():
             if not analysis_df.empty:
                 # Prepare data for Sankey
                 # Sources are accounts/recipients, targets are categories
-                sankey_df = analysis_df[['Account', 'Category', 'Amount']].copy()
-                sankey_df['Amount'] = abs(sankey_df['Amount'])
-                
                 # Group by source and target
-                flow_data = sankey_df.groupby(['Account', 'Category'])['Amount'].sum().reset_index()
+                flow_data = (
+                    amounts.abs()
+                    .groupby([analysis_df['Account'], analysis_df['Category']], observed=True)
+                    .sum()
+                    .reset_index()
+                )
                 flow_data = flow_data[flow_data['Amount'] > 0].sort_values('Amount', ascending=False).head(50)  # Top 50 flows
                 
                 if not flow_data.empty:
@@ -1569,11 +2384,8 @@ def main():
             # Category breakdown table and bar chart
             st.subheader("📊 Detailed Expense Breakdown")
             
-            expense_df = analysis_df[analysis_df['Amount'] < 0].copy()
-            expense_df['Amount'] = abs(expense_df['Amount'])
-            
-            if not expense_df.empty:
-                category_summary = expense_df.groupby('Category')['Amount'].sum().sort_values(ascending=False)
+            if not expense_by_category.empty:
+                category_summary = expense_by_category.sort_values(ascending=False)
                 
                 col1, col2 = st.columns([2, 1])
                 
@@ -1587,13 +2399,13 @@ def main():
             st.subheader("📈 Transaction Timeline")
             
             if 'Date' in analysis_df.columns:
-                timeline_df = analysis_df.copy()
-                timeline_df['Date'] = pd.to_datetime(timeline_df['Date'])
-                timeline_df = timeline_df.dropna(subset=['Date'])
+                # Date is already datetime64 (see normalize_dataframe), so only
+                # the amounts need to be indexed by it - no copy or re-parsing
+                has_date = analysis_df['Date'].notna()
                 
-                if not timeline_df.empty:
-                    timeline_df = timeline_df.set_index('Date').resample('D')['Amount'].sum().reset_index()
-                    st.line_chart(timeline_df.set_index('Date'))
+                if has_date.any():
+                    daily_amounts = amounts[has_date].set_axis(analysis_df.loc[has_date, 'Date']).resample('D').sum()
+                    st.line_chart(daily_amounts.to_frame())
         
         else:
             st.info("Upload and process files in the 'Upload & Process' tab first")
@@ -1624,6 +2436,16 @@ def main():
             st.write("✅ OCR (Pytesseract)" if OCR_AVAILABLE else "❌ OCR")
             st.write("✅ Ollama" if 'ollama' in dir() else "❌ Ollama")
         
+        st.subheader("Classification Cache")
+        st.markdown("Transactions classified before are answered from a local cache instead of asking Ollama again.")
+        
+        if st.button("🗑️ Clear Classification Cache"):
+            try:
+                clear_classification_cache()
+                st.success("Classification cache cleared!")
+            except Exception as e:
+                st.error(f"Could not clear cache: {e}")
+        
         st.subheader("Export Configuration")
         
         if st.button("📄 Export Current Config"):
@@ -9,6 +9,8 @@ import subprocess
 import sys
 import time
 
+import ollama
+
 def run_command(command):
     """Run a shell command and return the output."""
     try:
@@ -39,42 +41,26 @@ def check_ollama_installed():
         return False
 
 def check_ollama_running():
-    """Check if Ollama service is running."""
+    """Check if Ollama service is running and return the installed model names."""
     print("\nChecking if Ollama is running...")
-    success, stdout, stderr = run_command("ollama list")
-    
-    if success:
+    try:
+        # Ask the server directly instead of parsing the 'ollama list' table
+        installed_models = [model.model for model in ollama.list().models]
         print("✅ Ollama is running")
-        return True, stdout
-    else:
+        return True, installed_models
+    except Exception:
         print("❌ Ollama is not running")
         print()
         print("To start Ollama:")
         print("  Windows: Ollama should auto-start, or run 'ollama serve'")
         print("  Linux/Mac: Run 'ollama serve' in a separate terminal")
         print()
-        return False, ""
+        return False, []
 
-def parse_models(ollama_list_output):
-    """Parse the output of 'ollama list' to get model names."""
-    models = []
-    lines = ollama_list_output.strip().split('\n')
-    
-    # Skip header line
-    for line in lines[1:]:
-        if line.strip():
-            parts = line.split()
-            if parts:
-                models.append(parts[0])
-    
-    return models
-
-def check_models(model_list_output):
+def check_models(installed_models):
     """Check which recommended models are installed."""
     recommended_model = 'qwen3:4b-instruct-2507-q4_K_M'
     
-    installed_models = parse_models(model_list_output)
-    
     print("\nChecking recommended model...")
     print(f"Installed models: {', '.join(installed_models) if installed_models else 'None'}")
     print()
@@ -116,13 +102,13 @@ def main():
         sys.exit(1)
     
     # Check if running
-    is_running, models_output = check_ollama_running()
+    is_running, installed_models = check_ollama_running()
     if not is_running:
         print("\n⚠️  Please start Ollama first, then run this script again.")
         sys.exit(1)
     
     # Check models
-    found_models = check_models(models_output)
+    found_models = check_models(installed_models)
     
     # Recommend model if none found
     if not found_models: